@@ -0,0 +1,343 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  cache.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  content addressed on-disk artifact cache with size bounded LRU eviction
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import io
+import os
+import hashlib
+import time
+import tempfile
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+
+import numpy as np
+from shapely import wkb as swkb
+from matplotlib.path import Path
+
+
+TMP_STALE_S = 3600                                      # 超过该时间的临时文件视为写入中断的残留
+
+
+def source_id(source:str) -> str:
+    """
+    Description: identity of an input, files are identified by path, size
+    and modify time so that an edited file invalidates its artifacts
+    Input:
+        source: file path or any other name (e.g. natural earth feature)
+    Output:
+        identity string
+    """
+    if isinstance(source, str) and os.path.isfile(source):
+        stat = os.stat(source)
+        return "%s|%d|%d" % (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+    return repr(source)
+
+def _nbytes(value) -> int:
+    """
+    Description: approximate memory size of a decoded artifact
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, Path):
+        return value.vertices.nbytes + (value.codes.nbytes if value.codes is not None else 0)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    return 64
+
+
+class ArtifactCache:
+    """
+    Description: on-disk cache of pipeline artifacts ::
+
+        :  key   = sha1(namespace, inputs, parameters)
+        :  value = compressed npz blob (arrays, or shapely geometries as WKB)
+        :  file  = <root>/<key[:2]>/<key>.npz
+
+    writes go to a temporary file and are renamed into place, so concurrent
+    processes never see half a file; every hit touches the file, and when the
+    cache grows beyond max_mb the least recently used files (and temporary
+    files left by crashed writers) are deleted; decoded artifacts are also
+    kept in an in-process LRU layer bounded by memory_mb (see memo)
+    Input:
+        root: cache directory
+        max_mb: size cap in MB
+        memory_mb: in-process memory cap in MB
+    """
+
+    def __init__(self, root:str, max_mb:float=2048, memory_mb:float=256):
+        self.root         = root
+        self.max_bytes    = int(max_mb * 1024**2)
+        self.memory_bytes = int(memory_mb * 1024**2)
+        self.hits         = 0
+        self.misses       = 0
+        self.memory_hits  = 0
+        self.writes       = 0
+        self.evictions    = 0
+        self._bytes       = None                        # 已用空间, 首次写入时统计
+        self._memory      = OrderedDict()               # key -> (artifact, nbytes), 按使用先后排列
+        self._memory_used = 0
+        self._lock        = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, namespace:str, *parts) -> str:
+        """
+        Description: content key of an artifact
+        Input:
+            namespace: pipeline stage, e.g. "depth", "hillshade"
+            parts: inputs and parameters, existing file paths are replaced by source_id
+        Output:
+            key: "<namespace>-<sha1>"
+        """
+        text = "|".join(source_id(part) for part in parts)
+        return "%s-%s" % (namespace, hashlib.sha1(text.encode("utf-8")).hexdigest())
+
+    def path(self, key:str) -> str:
+        digest = key.rsplit("-", 1)[-1]
+        return os.path.join(self.root, digest[:2], key + ".npz")
+
+    def get(self, key:str) -> bytes:
+        """
+        Description: raw blob of key, None on a miss
+        """
+        file = self.path(key)
+        try:
+            with open(file, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(file)                              # 更新访问时间, 用于LRU淘汰
+        except FileNotFoundError:                       # 读取后被其他进程淘汰, 数据仍可用
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key:str, data:bytes):
+        """
+        Description: store the raw blob of key atomically, then evict if over the cap
+        """
+        file = self.path(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(file), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            try:
+                old = os.stat(file).st_size             # 覆盖已有文件时扣除其大小
+            except FileNotFoundError:
+                old = 0
+            os.replace(tmp_file, file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+        with self._lock:
+            self.writes += 1
+            if self._bytes is None:
+                self._bytes = self._scan()[1]
+            else:
+                self._bytes += len(data) - old
+            over = self._bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _entries(self) -> list:
+        """
+        Description: (mtime_ns, size, file) of artifacts and temporary files
+        """
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith((".npz", ".tmp")):
+                    continue
+                file = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(file)
+                except FileNotFoundError:                # 已被其他进程淘汰
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, file))
+        return entries
+
+    def _scan(self) -> tuple:
+        entries = self._entries()
+        artifacts = [file for _, _, file in entries if file.endswith(".npz")]
+        return len(artifacts), sum(size for _, size, _ in entries)
+
+    @staticmethod
+    def _stale(entry:tuple) -> bool:
+        mtime_ns, _, file = entry
+        return file.endswith(".tmp") and time.time_ns() - mtime_ns > TMP_STALE_S * 10**9
+
+    def evict(self, target:float=0.8):
+        """
+        Description: delete stale temporary files, then least recently used
+        artifacts until the cache is below target * max_bytes
+        """
+        entries = sorted(self._entries(), key=lambda entry: (not self._stale(entry), entry))
+        total = sum(size for _, size, _ in entries)
+        for entry in entries:
+            _, size, file = entry
+            if file.endswith(".tmp") and not self._stale(entry):
+                continue                                # 其他进程正在写入
+            if total <= target * self.max_bytes and not self._stale(entry):
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._bytes = total
+
+    def clear(self):
+        """
+        Description: delete every artifact and stale temporary file
+        """
+        for entry in self._entries():
+            file = entry[2]
+            if file.endswith(".tmp") and not self._stale(entry):
+                continue
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._bytes = None
+            self._memory.clear()
+            self._memory_used = 0
+
+    def stats(self) -> dict:
+        """
+        Description: hit/miss statistics of this process and the cache size
+        """
+        entries, size = self._scan()
+        lookups = self.hits + self.misses
+        return {
+            "hits"        : self.hits,
+            "misses"      : self.misses,
+            "hit_rate"    : self.hits / lookups if lookups else 0.0,
+            "memory_hits" : self.memory_hits,
+            "memory_mb"   : self._memory_used / 1024**2,
+            "writes"      : self.writes,
+            "evictions"   : self.evictions,
+            "entries"     : entries,
+            "size_mb"     : size / 1024**2,
+            "max_mb"      : self.max_bytes / 1024**2,
+        }
+
+    def memo(self, key:str, compute):
+        """
+        Description: in-process LRU layer of decoded artifacts, batch renders
+        skip the disk read; the least recently used artifacts are dropped
+        when the layer grows beyond memory_bytes
+        Input:
+            key: artifact key, see key()
+            compute: callable returning the artifact (usually reading the disk cache)
+        Output:
+            artifact
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key][0]
+
+        value = compute()
+        size = _nbytes(value)
+        if size > self.memory_bytes:
+            return value
+        with self._lock:
+            if key in self._memory:
+                self._memory_used -= self._memory.pop(key)[1]
+            self._memory[key] = (value, size)
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                self._memory_used -= self._memory.popitem(last=False)[1][1]
+        return value
+
+    def load_arrays(self, key:str) -> dict:
+        """
+        Description: arrays stored under key, None on a miss
+        """
+        data = self.get(key)
+        if data is None:
+            return None
+        with np.load(io.BytesIO(data)) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    def save_arrays(self, key:str, **arrays):
+        """
+        Description: store arrays under key as a compressed npz
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        self.put(key, buffer.getvalue())
+
+    def array(self, namespace:str, parts:list, compute) -> np.ndarray:
+        """
+        Description: cached array of a pipeline stage, compute() only runs on a miss
+        Input:
+            namespace: pipeline stage
+            parts: inputs and parameters of the stage
+            compute: callable returning the array
+        Output:
+            array
+        """
+        key = self.key(namespace, *parts)
+        arrays = self.load_arrays(key)
+        if arrays is not None:
+            return arrays["array"]
+        array = compute()
+        self.save_arrays(key, array=array)
+        return array
+
+    def geometries(self, namespace:str, parts:list, compute) -> list:
+        """
+        Description: cached shapely geometries (stored as WKB), compute() only runs on a miss
+        Input:
+            namespace: pipeline stage
+            parts: inputs and parameters of the stage
+            compute: callable returning an iterable of shapely geometries
+        Output:
+            geometries: list of shapely geometries
+        """
+        key = self.key(namespace, *parts)
+        arrays = self.load_arrays(key)
+        if arrays is not None:
+            wkb, offsets = arrays["wkb"].tobytes(), arrays["offsets"]
+            return [
+                swkb.loads(wkb[start:stop])
+                for start, stop in zip(offsets[:-1], offsets[1:])]
+
+        geometries = [geom for geom in compute() if geom is not None]
+        blobs = [swkb.dumps(geom) for geom in geometries]
+        self.save_arrays(
+            key,
+            wkb     = np.frombuffer(b"".join(blobs), dtype=np.uint8),
+            offsets = np.cumsum([0] + [len(blob) for blob in blobs]))
+        return geometries
+
+
+@lru_cache(maxsize=None)
+def open_cache(root:str, max_mb:float=2048, memory_mb:float=256) -> ArtifactCache:
+    """
+    Description: one ArtifactCache per directory and process, so that its
+    in-process layer is shared by the renders of a batch
+    """
+    return ArtifactCache(root, max_mb, memory_mb)
@@ -0,0 +1,194 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  catalogue.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  station catalogue of all cruises (sqlite with R*Tree index)
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import os
+import sqlite3
+
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT UNIQUE NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    cruise      TEXT,
+    section     TEXT
+);
+CREATE TABLE IF NOT EXISTS stations (
+    id          INTEGER PRIMARY KEY,
+    file_id     INTEGER NOT NULL REFERENCES files(id),
+    seq         INTEGER NOT NULL,
+    cruise      TEXT,
+    section     TEXT,
+    name        TEXT,
+    type        TEXT,
+    code        TEXT,
+    status      TEXT,
+    lon         REAL NOT NULL,
+    lat         REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stations_file ON stations(file_id);
+CREATE INDEX IF NOT EXISTS stations_cruise ON stations(cruise);
+CREATE VIRTUAL TABLE IF NOT EXISTS stations_rtree USING rtree(
+    id, min_lon, max_lon, min_lat, max_lat
+);
+"""
+
+# Excel模板列名 -> 数据库字段
+COLUMNS:dict = {
+    "站点名称" : "name",
+    "站点类型" : "type",
+    "站点编号" : "code",
+    "站点状态" : "status",
+}
+
+
+def connect(db_path:str) -> sqlite3.Connection:
+    """
+    Description: open (and create if missing) the station catalogue
+    Input:
+        db_path: sqlite file path
+    Output:
+        conn: sqlite3 connection
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def read_station_table(file:str) -> pd.DataFrame:
+    """
+    Description: read a station excel template, convert degree/minute to decimal
+    Input:
+        file: excel file path
+    Output:
+        table: name, type, code, status, lon, lat (rows without position dropped)
+    """
+    ds = pd.read_excel(file, sheet_name=0)
+    try:
+        lon = ds['经度(度)'] + ds['经度(分)'] / 60
+        lat = ds['纬度(度)'] + ds['纬度(分)'] / 60
+    except KeyError:
+        raise ValueError("excel文件经纬度数据列名错误: %s" % file)
+
+    table = pd.DataFrame({'lon': lon, 'lat': lat})
+    for column, field in COLUMNS.items():
+        table[field] = ds[column].astype(str).where(ds[column].notna(), None) if column in ds else None
+    return table.dropna(subset=['lon', 'lat'])
+
+def prune(conn:sqlite3.Connection) -> int:
+    """
+    Description: remove the stations of files that no longer exist (deleted or
+    renamed), so that they disappear from the map and the route
+    Input:
+        conn: catalogue connection
+    Output:
+        count: number of files removed
+    """
+    gone = [
+        file_id for file_id, path in conn.execute("SELECT id, path FROM files")
+        if not os.path.isfile(path)]
+    with conn:
+        for file_id in gone:
+            conn.execute(
+                "DELETE FROM stations_rtree WHERE id IN (SELECT id FROM stations WHERE file_id = ?)",
+                (file_id,))
+            conn.execute("DELETE FROM stations WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+    return len(gone)
+
+def ingest(conn:sqlite3.Connection, files:list, cruise:str=None) -> int:
+    """
+    Description: add station excel files to the catalogue incrementally,
+    files whose size, modify time and cruise are unchanged are skipped, changed files
+    replace their previous stations and files gone from disk are pruned
+    Input:
+        conn: catalogue connection
+        files: excel file paths, file name (without suffix) is the section name
+        cruise: cruise name, default the name of the directory holding the file
+    Output:
+        count: number of files (re)ingested
+    """
+    prune(conn)
+    count = 0
+    for file in files:
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        file_cruise = cruise or os.path.basename(os.path.dirname(path))
+        row = conn.execute(
+            "SELECT id, size, mtime_ns, cruise FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[1:] == (stat.st_size, stat.st_mtime_ns, file_cruise):
+            continue
+
+        section = os.path.splitext(os.path.basename(path))[0]
+        table = read_station_table(path)
+
+        with conn:
+            if row is not None:
+                file_id = row[0]
+                conn.execute(
+                    "DELETE FROM stations_rtree WHERE id IN (SELECT id FROM stations WHERE file_id = ?)",
+                    (file_id,))
+                conn.execute("DELETE FROM stations WHERE file_id = ?", (file_id,))
+                conn.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ?, cruise = ?, section = ? WHERE id = ?",
+                    (stat.st_size, stat.st_mtime_ns, file_cruise, section, file_id))
+            else:
+                file_id = conn.execute(
+                    "INSERT INTO files (path, size, mtime_ns, cruise, section) VALUES (?, ?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns, file_cruise, section)).lastrowid
+
+            for seq, station in enumerate(table.itertuples(index=False)):
+                station_id = conn.execute(
+                    "INSERT INTO stations (file_id, seq, cruise, section, name, type, code, status, lon, lat) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (file_id, seq, file_cruise, section,
+                     station.name, station.type, station.code, station.status,
+                     float(station.lon), float(station.lat))).lastrowid
+                conn.execute(
+                    "INSERT INTO stations_rtree VALUES (?, ?, ?, ?, ?)",
+                    (station_id, station.lon, station.lon, station.lat, station.lat))
+        count += 1
+    return count
+
+def query(conn:sqlite3.Connection, ll_bbox:list=None, cruise:str=None, section:str=None,
+          station_type:str=None, status:str=None) -> pd.DataFrame:
+    """
+    Description: query stations, the bbox filter uses the R*Tree index
+    Input:
+        conn: catalogue connection
+        ll_bbox: [lon_min, lon_max, lat_min, lat_max], None for all
+        cruise, section, station_type, status: equality filters, None for all
+    Output:
+        stations: cruise, section, 站点名称, 站点类型, 站点编号, 站点状态,
+                  decimal_lon, decimal_lat, ordered by section and file order
+    """
+    sql = (
+        "SELECT s.cruise, s.section, s.name, s.type, s.code, s.status, "
+        "s.lon AS decimal_lon, s.lat AS decimal_lat FROM stations s")
+    where, params = [], []
+    if ll_bbox is not None:
+        sql += " JOIN stations_rtree r ON r.id = s.id"
+        where += ["r.max_lon >= ?", "r.min_lon <= ?", "r.max_lat >= ?", "r.min_lat <= ?"]
+        params += [ll_bbox[0], ll_bbox[1], ll_bbox[2], ll_bbox[3]]
+    for field, value in (("cruise", cruise), ("section", section),
+                         ("type", station_type), ("status", status)):
+        if value is not None:
+            where.append("s.%s = ?" % field)
+            params.append(value)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY s.cruise, s.section, s.seq"
+
+    stations = pd.read_sql_query(sql, conn, params=params)
+    return stations.rename(columns={field: column for column, field in COLUMNS.items()})
@@ -0,0 +1,184 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  geocache.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  cache of projected and clipped geometry paths
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import warnings
+
+import numpy as np
+import shapely.geometry as sgeom
+from shapely.errors import ShapelyError
+from shapely.validation import make_valid
+import cartopy.crs as ccrs
+from cartopy.mpl.patch import geos_to_path
+from matplotlib.path import Path
+from matplotlib.collections import PathCollection
+
+
+def projected_extent(proj, ll_bbox:list) -> list:
+    """
+    Description: extent of ll_bbox in projection coordinate,
+    same as what GeoAxes.set_extent(ll_bbox, crs=PlateCarree()) sets
+    Input:
+        proj: target cartopy projection
+        ll_bbox: [lon_min, lon_max, lat_min, lat_max]
+    Output:
+        extent: [x_min, x_max, y_min, y_max]
+    """
+    lon_min, lon_max, lat_min, lat_max = ll_bbox
+    domain = sgeom.LineString([
+        [lon_min, lat_min], [lon_max, lat_min],
+        [lon_max, lat_max], [lon_min, lat_max],
+        [lon_min, lat_min]])
+    x_min, y_min, x_max, y_max = proj.project_geometry(domain, ccrs.PlateCarree()).bounds
+    return [x_min, x_max, y_min, y_max]
+
+def _lonlat_bbox(proj, extent:list, num:int=50) -> list:
+    """
+    Description: longitude latitude bounds of a projected extent, used to
+    skip geometries far outside the map before projecting them
+    """
+    x_min, x_max, y_min, y_max = extent
+    xs = np.concatenate([
+        np.linspace(x_min, x_max, num), np.full(num, x_max),
+        np.linspace(x_max, x_min, num), np.full(num, x_min)])
+    ys = np.concatenate([
+        np.full(num, y_min), np.linspace(y_min, y_max, num),
+        np.full(num, y_max), np.linspace(y_max, y_min, num)])
+    lonlat = ccrs.PlateCarree().transform_points(proj, xs, ys)
+    return [
+        np.nanmin(lonlat[:, 0]), np.nanmax(lonlat[:, 0]),
+        np.nanmin(lonlat[:, 1]), np.nanmax(lonlat[:, 1])]
+
+def _repair(geom):
+    """
+    Description: make an invalid geometry valid, valid geometries are returned as is
+    """
+    return geom if geom.is_valid else make_valid(geom)
+
+def project_geometries(geometries, proj, extent:list, tolerance:float) -> list:
+    """
+    Description: project, clip and simplify geometries (longitude latitude) to paths
+    Input:
+        geometries: iterable of shapely geometries in PlateCarree
+        proj: target cartopy projection
+        extent: [x_min, x_max, y_min, y_max] in projection coordinate
+        tolerance: simplify tolerance, relative to the extent width
+    Output:
+        paths: list of matplotlib.path.Path in projection coordinate
+    """
+    src_crs = ccrs.PlateCarree()
+    x_min, x_max, y_min, y_max = extent
+    margin = 0.02 * max(x_max - x_min, y_max - y_min)
+    clip = sgeom.box(x_min - margin, y_min - margin, x_max + margin, y_max + margin)
+
+    lon_min, lon_max, lat_min, lat_max = _lonlat_bbox(proj, extent)
+    lonlat_clip = sgeom.box(lon_min - 1, lat_min - 1, lon_max + 1, lat_max + 1)
+
+    paths = []
+    for geom in geometries:
+        if geom is None or geom.is_empty:
+            continue
+        try:
+            geom = _repair(geom)                        # 无效多边形在投影空间裁剪时会引发拓扑异常
+            if not geom.intersects(lonlat_clip):
+                continue
+            geom = _repair(proj.project_geometry(geom, src_crs)).intersection(clip)
+            if tolerance > 0:
+                geom = geom.simplify(tolerance * (x_max - x_min), preserve_topology=False)
+        except ShapelyError as err:                     # 跳过无法修复的要素, 不中断整幅地图
+            warnings.warn("skip geometry: %s" % err)
+            continue
+        if geom.is_empty:
+            continue
+        sub_paths = geos_to_path(geom)
+        if sub_paths:
+            paths.append(Path.make_compound_path(*sub_paths))
+    return paths
+
+def _paths_to_arrays(paths:list) -> dict:
+    """
+    Description: flatten paths to (vertices, codes, offsets) arrays for the artifact cache
+    """
+    vertices = [p.vertices for p in paths]
+    codes = [
+        p.codes if p.codes is not None else np.full(len(p.vertices), Path.LINETO, dtype=Path.code_type)
+        for p in paths]
+    return {
+        "vertices" : np.concatenate(vertices) if vertices else np.empty((0, 2)),
+        "codes"    : np.concatenate(codes) if codes else np.empty(0, dtype=Path.code_type),
+        "offsets"  : np.cumsum([0] + [len(v) for v in vertices])}
+
+def _arrays_to_paths(arrays:dict) -> list:
+    vertices, codes, offsets = arrays["vertices"], arrays["codes"], arrays["offsets"]
+    return [
+        Path(vertices[start:stop], codes[start:stop])
+        for start, stop in zip(offsets[:-1], offsets[1:])]
+
+def projected_paths(source:str, load, proj, ll_bbox:list,
+                    tolerance:float=1e-4, cache=None) -> list:
+    """
+    Description: projected and clipped paths of a geometry source, cached
+    by (source, projection, extent, tolerance) in the artifact cache (and its
+    in-process layer), the parsed source geometries are cached as WKB as well, so the
+    source is only read on the first render and only projected once per
+    projection and extent
+    Input:
+        source: shapefile path or name of the geometry source
+        load: callable returning the geometries (PlateCarree) of source
+        proj: target cartopy projection
+        ll_bbox: [lon_min, lon_max, lat_min, lat_max]
+        tolerance: simplify tolerance, relative to the map width
+        cache: cache.ArtifactCache, None for no cache
+    Output:
+        paths: list of matplotlib.path.Path in projection coordinate
+    """
+    extent = projected_extent(proj, ll_bbox)
+    if cache is None:
+        return project_geometries(load(), proj, extent, tolerance)
+
+    parts = [source, proj.proj4_init, ["%.6f" % v for v in extent], tolerance]
+    key = cache.key("paths", *parts)
+
+    def compute():
+        arrays = cache.load_arrays(key)
+        if arrays is not None:
+            return _arrays_to_paths(arrays)
+        geometries = cache.geometries("geom", [source], load)
+        paths = project_geometries(geometries, proj, extent, tolerance)
+        cache.save_arrays(key, **_paths_to_arrays(paths))
+        return paths
+
+    return cache.memo(key, compute)
+
+def draw_paths(ax, paths:list, facecolor=None, edgecolor=None, linewidth=None,
+               linestyle='-', zorder=None, alpha=None) -> PathCollection:
+    """
+    Description: draw projected paths on GeoAxes, equivalent to ax.add_feature
+    without re-projecting at draw time
+    Input:
+        ax: cartopy GeoAxes
+        paths: paths in ax projection coordinate
+        facecolor, edgecolor, linewidth, linestyle, zorder, alpha: style
+    Output:
+        collection: matplotlib.collections.PathCollection
+    """
+    collection = PathCollection(
+        paths,
+        facecolor = facecolor,
+        edgecolor = edgecolor,
+        linewidth = linewidth,
+        linestyle = linestyle,
+        zorder    = zorder,
+        alpha     = alpha,
+        transform = ax.transData
+    )
+    collection.set_clip_path(ax.patch)
+    ax.add_collection(collection, autolim=False)
+    return collection
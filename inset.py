@@ -0,0 +1,119 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  inset.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  overview (inset locator) map with cached world background
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import io
+from functools import lru_cache
+
+import numpy as np
+import matplotlib.pyplot as plt
+import cartopy.crs as ccrs
+import cartopy.feature as cfeat
+
+from utils import cal_center, generate_rectangle
+
+
+WORLD_EXTENT = [-180, 180, -90, 90]                     # 全球底图经纬度范围
+
+
+def render_world_background(width:int=720,
+                            land_color:str='lightgrey',
+                            ocean_color:str='white',
+                            coast_color:str='black') -> np.ndarray:
+    """
+    Description: render a low resolution world map (PlateCarree) to a raster,
+    only called once, the raster is cached and reused by every inset afterwards
+    Input:
+        width: image width in pixel, height is width/2
+        land_color: land face color
+        ocean_color: ocean (background) color
+        coast_color: coastline color
+    Output:
+        image: (height, width, 4) uint8 rgba array
+    """
+    dpi = 100
+    fig = plt.figure(figsize=(width/dpi, width/dpi/2), dpi=dpi, facecolor=ocean_color)
+    ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.PlateCarree())
+    ax.set_global()
+    ax.set_facecolor(ocean_color)
+    ax.spines['geo'].set_visible(False)
+    ax.add_feature(cfeat.LAND, facecolor=land_color, edgecolor='none')
+    ax.coastlines(resolution='110m', linewidth=0.3, color=coast_color)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, facecolor=ocean_color)
+    plt.close(fig)
+    buffer.seek(0)
+    return (plt.imread(buffer) * 255).round().astype(np.uint8)
+
+@lru_cache(maxsize=4)
+def load_world_background(cache=None, width:int=720,
+                          land_color:str='lightgrey',
+                          ocean_color:str='white',
+                          coast_color:str='black') -> np.ndarray:
+    """
+    Description: load the cached world background, render it on a cache miss
+    Input:
+        cache: cache.ArtifactCache, None for in memory cache only
+        width, land_color, ocean_color, coast_color: see render_world_background
+    Output:
+        image: (height, width, 4) uint8 rgba array
+    """
+    compute = lambda: render_world_background(width, land_color, ocean_color, coast_color)
+    if cache is None:
+        return compute()
+    return cache.array("inset", [width, land_color, ocean_color, coast_color], compute)
+
+def add_inset_locator(ax, ll_bbox:list, cache=None,
+                      bounds:tuple=(0.0, 0.78, 0.22, 0.22),
+                      pad:float=4,
+                      width:int=720,
+                      land_color:str='lightgrey',
+                      ocean_color:str='white',
+                      coast_color:str='black',
+                      edgecolor:str='red',
+                      zorder:int=21):
+    """
+    Description: add a small overview map with the ll_bbox rectangle to ax,
+    the inset is a plain matplotlib axes showing the cached world raster,
+    so no coastline is loaded or projected at draw time
+    Input:
+        ax: main axes
+        ll_bbox: [lon_min, lon_max, lat_min, lat_max]
+        cache: cache.ArtifactCache of the world background
+        bounds: [x0, y0, width, height] of the inset in ax coordinate
+        pad: inset span relative to the larger side of ll_bbox
+        width: world background width in pixel
+        land_color, ocean_color, coast_color: world background colors
+        edgecolor: rectangle edge color
+        zorder: inset zorder
+    Output:
+        ax_inset: inset axes
+    """
+    world = load_world_background(cache, width, land_color, ocean_color, coast_color)
+
+    ax_inset = ax.inset_axes(bounds, zorder=zorder)
+    ax_inset.imshow(
+        world,
+        origin        = 'upper',
+        extent        = WORLD_EXTENT,
+        interpolation = 'bilinear'
+        )
+
+    # 以LL_BBOX中心为概览图中心, 按pad倍扩展显示范围
+    lon_c, lat_c = cal_center(ll_bbox)
+    half = max(ll_bbox[1]-ll_bbox[0], ll_bbox[3]-ll_bbox[2]) * pad / 2
+    ax_inset.set_xlim(max(lon_c-half, WORLD_EXTENT[0]), min(lon_c+half, WORLD_EXTENT[1]))
+    ax_inset.set_ylim(max(lat_c-half, WORLD_EXTENT[2]), min(lat_c+half, WORLD_EXTENT[3]))
+
+    ax_inset.add_patch(generate_rectangle(ll_bbox, edgecolor=edgecolor, zorder=2))
+    ax_inset.set_xticks([])
+    ax_inset.set_yticks([])
+    return ax_inset
@@ -0,0 +1,185 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  isobath.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  cached isobath contour layer
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import numpy as np
+import shapely.geometry as sgeom
+import cartopy.crs as ccrs
+from contourpy import contour_generator, LineType
+from matplotlib.collections import LineCollection
+
+from utils import downsample
+
+
+def pyramid_factor(shape:tuple, out_pixels:int) -> int:
+    """
+    Description: downsample factor of the pyramid level whose width does not
+    exceed the output width, contouring finer than one output pixel is wasted
+    Input:
+        shape: (lat_length, lon_length) of the raster
+        out_pixels: map width in output pixels
+    Output:
+        factor: block size for utils.downsample
+    """
+    return max(1, int(np.ceil(shape[1] / max(out_pixels, 1))))
+
+def compute_isobaths(depth:np.ndarray, ll_bbox:list, levels:list,
+                     tolerance:float=2e-4, factor:int=1) -> dict:
+    """
+    Description: isobath lines of a regular grid spanning ll_bbox (origin lower)
+    Input:
+        depth: depth array, land is nan
+        ll_bbox: [lon_min, lon_max, lat_min, lat_max] of depth
+        levels: isobath depths, e.g. [-3000, -1000, -200]
+        tolerance: simplify tolerance, relative to the ll_bbox width
+        factor: pyramid level (downsample factor) to contour on
+    Output:
+        isobaths: {level: [(N, 2) lon/lat array, ...]}
+    """
+    lon_min, lon_max, lat_min, lat_max = ll_bbox
+    ny, nx = depth.shape
+
+    # 像元中心经纬度, 与imshow(extent=ll_bbox)一致
+    lon = lon_min + (np.arange(nx) + 0.5) * (lon_max - lon_min) / nx
+    lat = lat_min + (np.arange(ny) + 0.5) * (lat_max - lat_min) / ny
+    z   = np.ma.masked_invalid(downsample(depth, factor))
+    lon = downsample(lon, factor)
+    lat = downsample(lat, factor)
+
+    generator = contour_generator(lon, lat, z, line_type=LineType.Separate)
+    simplify  = tolerance * (lon_max - lon_min)
+
+    isobaths = {}
+    for level in levels:
+        lines = []
+        for line in generator.lines(level):
+            if len(line) < 2:
+                continue
+            if simplify > 0:
+                line = np.asarray(sgeom.LineString(line).simplify(simplify).coords)
+            if len(line) >= 2:
+                lines.append(line)
+        isobaths[level] = lines
+    return isobaths
+
+def _isobaths_to_arrays(isobaths:dict) -> dict:
+    """
+    Description: flatten isobaths to (vertices, offsets, levels) arrays for the artifact cache
+    """
+    lines  = [line for level in isobaths for line in isobaths[level]]
+    levels = [level for level in isobaths for _ in isobaths[level]]
+    return {
+        "vertices" : np.concatenate(lines) if lines else np.empty((0, 2)),
+        "offsets"  : np.cumsum([0] + [len(line) for line in lines]),
+        "levels"   : np.asarray(levels, dtype=np.float64),
+        "keys"     : np.asarray(list(isobaths), dtype=np.float64)}
+
+def _arrays_to_isobaths(arrays:dict) -> dict:
+    vertices, offsets = arrays["vertices"], arrays["offsets"]
+    isobaths = {key.item(): [] for key in arrays["keys"]}
+    for level, start, stop in zip(arrays["levels"], offsets[:-1], offsets[1:]):
+        isobaths[level.item()].append(vertices[start:stop])
+    return isobaths
+
+def isobath_lines(source:str, depth:np.ndarray, ll_bbox:list, levels:list,
+                  tolerance:float=2e-4, factor:int=1, cache=None) -> dict:
+    """
+    Description: compute_isobaths cached by (grid, bbox, levels) in the
+    artifact cache (and its in-process layer), marching squares only runs on a cache miss
+    Input:
+        source: netCDF path of depth, identifies the grid together with its shape
+        cache: cache.ArtifactCache, None for no cache
+        others: see compute_isobaths
+    Output:
+        isobaths: {level: [(N, 2) lon/lat array, ...]}
+    """
+    if cache is None:
+        return compute_isobaths(depth, ll_bbox, levels, tolerance, factor)
+
+    key = cache.key(
+        "isobath",
+        source,
+        tuple(depth.shape),
+        ["%.6f" % v for v in ll_bbox],
+        ["%g" % v for v in levels],
+        tolerance,
+        factor)
+
+    def compute():
+        arrays = cache.load_arrays(key)
+        if arrays is not None:
+            return _arrays_to_isobaths(arrays)
+        isobaths = compute_isobaths(depth, ll_bbox, levels, tolerance, factor)
+        cache.save_arrays(key, **_isobaths_to_arrays(isobaths))
+        return isobaths
+
+    return cache.memo(key, compute)
+
+def draw_isobaths(ax, isobaths:dict, color='dimgrey', linewidth:float=0.3,
+                  fontsize:float=4, labels:int=2, zorder:int=15) -> LineCollection:
+    """
+    Description: draw isobaths with depth labels on the longest lines
+    Input:
+        ax: cartopy GeoAxes
+        isobaths: output of isobath_lines
+        color, linewidth, zorder: line style
+        fontsize: label font size
+        labels: number of labelled lines per level, 0 for no label
+    Output:
+        collection: matplotlib.collections.LineCollection
+    """
+    lines = [line for level in isobaths for line in isobaths[level]]
+    if not lines:
+        return None
+
+    # 所有顶点一次性投影至地图坐标
+    vertices = np.concatenate(lines)
+    projected = ax.projection.transform_points(
+        ccrs.PlateCarree(), vertices[:, 0], vertices[:, 1])[:, :2]
+    offsets = np.cumsum([0] + [len(line) for line in lines])
+    segments = [projected[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+
+    collection = LineCollection(
+        segments,
+        colors     = color,
+        linewidths = linewidth,
+        zorder     = zorder,
+        transform  = ax.transData
+    )
+    collection.set_clip_path(ax.patch)
+    ax.add_collection(collection, autolim=False)
+
+    idx = 0
+    for level in isobaths:
+        level_segments = segments[idx:idx + len(isobaths[level])]
+        idx += len(isobaths[level])
+        longest = sorted(level_segments, key=len, reverse=True)[:labels]
+        for segment in longest:
+            if len(segment) < 3:
+                continue
+            mid = len(segment) // 2
+            dx, dy = segment[mid + 1] - segment[mid - 1]
+            angle = np.degrees(np.arctan2(dy, dx))
+            angle = angle - 180 if angle > 90 else angle + 180 if angle < -90 else angle
+            text = ax.text(
+                segment[mid, 0], segment[mid, 1], "%g" % level,
+                fontsize      = fontsize,
+                color         = color,
+                ha            = 'center',
+                va            = 'center',
+                rotation      = angle,
+                rotation_mode = 'anchor',
+                zorder        = zorder,
+                transform     = ax.transData,
+                bbox          = dict(boxstyle='square,pad=0', facecolor='white', edgecolor='none', alpha=0.6),
+                clip_on       = True
+            )
+            text.set_clip_path(ax.patch)
+    return collection
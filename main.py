@@ -10,11 +10,15 @@
 '''
 
 import os
+import sys
+import argparse
 import warnings
+import subprocess
 from glob import glob
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeat
@@ -22,6 +26,14 @@ from cartopy.mpl.geoaxes import GeoAxes
 
 from param import *
 from utils import *
+from inset import add_inset_locator
+from geocache import projected_paths, draw_paths, projected_extent
+from warp import warp_index, warp
+from catalogue import connect, ingest, query
+from cache import open_cache
+from isobath import isobath_lines, draw_isobaths, pyramid_factor
+from route import plan_route, route_length, steaming_hours, draw_route
+from pipeline import TaskGraph
 
 warnings.filterwarnings(
     'ignore', 
@@ -41,19 +53,33 @@ plt.rcParams['font.family'] = ['times new roman']       # 定义英文字体为
 plt.rcParams["font.sans-serif"]=["SimHei"]              # 定义中文字体为宋体
 
 
-def main():
+def main(preview:bool=False, refine:bool=False, cache_stats:bool=False) -> str:
+    """
+        Description : plot the station map
+        Input       :
+            preview: draft render, low dpi, coarse bathymetry, simplified
+                     geometries and no hillshade (see param.preview_param)
+            refine: with preview, start the final quality render in a
+                    background process after the draft is saved
+            cache_stats: print the artifact cache statistics
+        output      : output image path
+    """
     # 设置常量
-    DPI = 1200                                          # 分辨率
+    DPI = preview_param["dpi"] if preview else 1200     # 分辨率
 
     SCATTER_SIZE = 15                                   # 散点大小
     SCATTER_LINEWIDTH = 0.5                             # 散点线宽
     SCATTER_ALPHA = 0.8                                 # 散点透明度
+    SCATTER_ZORDER = 24                                 # 散点图层, 高于概览图与航线
 
     LL_BBOX = [105, 125, 5, 25]                         # 经纬度边界
-    PROJ = ccrs.PlateCarree()                           # 投影方式
+    DATA_CRS = ccrs.PlateCarree()                       # 数据坐标系(经纬度)
+    PROJ = build_projection(proj_param["name"], LL_BBOX) # 投影方式
+    TOLERANCE = preview_param["tolerance"] if preview else proj_param["tolerance"]  # 几何简化容差
+    FACTOR = preview_param["factor"] if preview else 1  # 水深金字塔层级
     
     ROOT = os.path.dirname(os.path.abspath(__file__))   # 获取当前文件路径
-    OUT  = "marineRsearch.png"                          # 输出文件名
+    OUT  = preview_param["out"] if preview else "marineRsearch.png"    # 输出文件名
     
     GRID_FONTSIZE = 8                                   # 网格字体大小
     LEGEND_FONTSIZE = 5                                 # 图例字体大小
@@ -61,142 +87,258 @@ def main():
     AZIMUTH = 315                                       # 光源方位角
     ALTITUDE = 45                                       # 光源高度角
 
+    HILLSHADE = not preview                             # 是否绘制山体阴影
+    INSET = True                                        # 是否绘制概览图
+    ISOBATH = True                                      # 是否绘制等深线
+    ROUTE = True                                        # 是否规划并绘制站点航线
+    CACHE = open_cache(os.path.join(ROOT, cache_dir), cache_max_mb, cache_memory_mb)    # 中间结果缓存
+    CATALOGUE = os.path.join(ROOT, catalogue_dir)       # 站点库路径
+    WORKERS = min(8, os.cpu_count() or 1)               # 数据加载线程数
+
     lon_min, lon_max, lat_min, lat_max = LL_BBOX        # 分取边界角点
 
-    fig = plt.figure(dpi=DPI)
-    
-    ax:GeoAxes = fig.add_subplot(1,1,1,projection=PROJ)
-    ax.set_extent(LL_BBOX,crs=ccrs.PlateCarree())       # 设置显示范围
+    # 数据加载作为依赖图在线程池中执行, 与坐标轴的创建重叠; 绘图只在主线程进行
+    executor = ThreadPoolExecutor(max_workers=WORKERS)
+    try:
+        graph = TaskGraph(executor)
+
+        # Natural Earth要素, 投影裁剪后的路径按(数据源, 投影, 范围, 容差)缓存
+        for key, value in feature_dir.items():
+            scale = preview_param["scale"] if preview else value['scale']
+            nature = cfeat.NaturalEarthFeature(
+                value['category'], value['name'], scale)
+            graph.add(
+                "feature/" + key, partial(projected_paths,
+                "natural_earth/%s/%s/%s" % (value['category'], value['name'], scale),
+                nature.geometries,
+                PROJ, LL_BBOX, TOLERANCE, CACHE))
+
+        for key, value in shp_dir.items():                  # 读取shp文件
+            ABS_DIR = os.path.join(ROOT, value['dir'])      # 获取shp文件路径
+
+            # Shapfiles为经纬度坐标, 投影至目标坐标系后缓存
+            graph.add(
+                "shp/" + key, partial(projected_paths,
+                ABS_DIR,
+                lambda path=ABS_DIR: Reader(path).geometries(),
+                PROJ, LL_BBOX, TOLERANCE, CACHE))
+
+        # 深度数据 --> 山体阴影
+        graph.add("depth", lambda: CACHE.array(
+            "depth", [gebcco_dir["SCS"], LL_BBOX, FACTOR],
+            lambda: load_depth_ds(gebcco_dir["SCS"], LL_BBOX, FACTOR, CACHE)))
+        if HILLSHADE:
+            graph.add("hillshade", lambda depth: CACHE.array(
+                "hillshade", [gebcco_dir["SCS"], LL_BBOX, FACTOR, AZIMUTH, ALTITUDE],
+                lambda: hillshade(-depth,AZIMUTH,ALTITUDE).astype(np.float32)), "depth")
+
+        # 等深线在与输出分辨率相当的金字塔层级上计算, 结果按(网格, 范围, 深度)缓存
+        if ISOBATH:
+            out_pixels = plt.rcParams["figure.figsize"][0] * DPI
+            graph.add("isobath", lambda depth: isobath_lines(
+                gebcco_dir["SCS"], depth, LL_BBOX,
+                isobath_param["levels"], isobath_param["tolerance"],
+                pyramid_factor(depth.shape, out_pixels), CACHE), "depth")
+
+        # 非经纬度投影时, 用缓存的像元索引一次性重采样至地图坐标, 避免imshow逐次重投影
+        # 像元索引只依赖水深网格大小, 与山体阴影并行计算
+        RASTERS = ["depth", "hillshade"] if HILLSHADE else ["depth"]
+        if PROJ != DATA_CRS:
+            RASTER_EXTENT = projected_extent(PROJ, LL_BBOX)
+            RASTER_CRS    = PROJ
+            graph.add("warp_index", lambda depth: warp_index(
+                depth.shape, LL_BBOX, PROJ, RASTER_EXTENT, depth.shape, CACHE), "depth")
+            graph.add("raster", warp, "warp_index", *RASTERS)
+        else:
+            RASTER_EXTENT = LL_BBOX
+            RASTER_CRS    = DATA_CRS
+            graph.add("raster", lambda *rasters: list(rasters), *RASTERS)
+
+        # 航次站点, 站点表增量写入站点库, 仅查询LL_BBOX范围内的站点
+        def load_stations():
+            conn = connect(CATALOGUE)                       # sqlite连接只在创建它的线程中使用
+            try:
+                ingest(conn, glob(os.path.join(ROOT, table_dir), recursive=True), cruise_name)
+                return query(conn, ll_bbox=LL_BBOX, **station_filter)
+            finally:
+                conn.close()
+
+        graph.add("stations", load_stations)
+
+        # 按航次分别规划站点的访问顺序, 不同航次的站点不连成一条航线
+        if ROUTE:
+            def route(stations):
+                routes = []
+                for cruise, ds in stations.groupby('cruise', sort=False):
+                    if len(ds) < 2:
+                        continue
+                    lon, lat = ds['decimal_lon'].values, ds['decimal_lat'].values
+                    order, dist = plan_route(lon, lat)
+                    routes.append((cruise, lon, lat, order, dist, steaming_hours(order, dist, route_param["speed"])))
+                return routes
+
+            graph.add("route", route, "stations")
+
+        fig = plt.figure(dpi=DPI)
     
-    # 添加相关shp资料
-    ax.coastlines(
-        resolution = '50m',                             # 分辨率
-        linewidth = 0.5,                                # 线宽
-        edgecolor = 'black',                            # 边缘颜色
-        zorder = 20)                                    # 层级      
-    ax.add_feature(
-        cfeat.BORDERS,                                  # 添加边界
-        linewidth = 0.8, 
-        linestyle = '-',                                # 线型
-        zorder = 20)
-    ax.add_feature(
-        cfeat.LAND, 
-        facecolor = 'grey',                             # 陆地颜色
-        alpha = 0.5,                                    # 透明度 
-        zorder = 10)
+        ax:GeoAxes = fig.add_subplot(1,1,1,projection=PROJ)
+        ax.set_extent(LL_BBOX,crs=DATA_CRS)                 # 设置显示范围
     
-    for _, value in shp_dir.items():                    # 读取shp文件
-        ABS_DIR = os.path.join(ROOT, value['dir'])      # 获取shp文件路径
-
-        # 基于已定义的投影坐标系读取Shapfiles
-        shp_var = cfeat.ShapelyFeature(
-            Reader(ABS_DIR).geometries(),
-            PROJ,
-        )
-        
-        ax.add_feature(
-            shp_var, 
-            facecolor = value["facecolor"],
-            edgecolor = value["edgecolor"],
-            linewidth = value["linewidth"],
-            linestyle = value["linestyle"],
-            zorder    = value["zorder"],
-        )
-        del _, value
+        # 添加Natural Earth要素
+        for key, value in feature_dir.items():
+            draw_paths(
+                ax, graph.result("feature/" + key),
+                facecolor = value["facecolor"],
+                edgecolor = value["edgecolor"],
+                linewidth = value["linewidth"],
+                linestyle = value["linestyle"],
+                alpha     = value["alpha"],
+                zorder    = value["zorder"],
+            )
+
+        for key, value in shp_dir.items():
+            draw_paths(
+                ax, graph.result("shp/" + key),
+                facecolor = value["facecolor"],
+                edgecolor = value["edgecolor"],
+                linewidth = value["linewidth"],
+                linestyle = value["linestyle"],
+                zorder    = value["zorder"],
+            )
     
-    # 添加深度数据并获取经纬度范围
-    depth      = load_depth_ds(gebcco_dir["SCS"], LL_BBOX)
-    hill_shade = hillshade(-depth,AZIMUTH,ALTITUDE)
-
-    # 添加自定义color map
-    cmap = custom_cmap()
-
-    # 绘制深度图及深度梯度计算所得山体阴影
-    cf = ax.imshow(
-        depth,
-        origin        = 'lower',
-        cmap          = cmap,
-        extent        = LL_BBOX,
-        transform     = PROJ,
-        vmin          = -6000, 
-        vmax          = 200,
-        interpolation = 'nearest'
-        )
+        # 重采样后的深度及山体阴影
+        if HILLSHADE:
+            depth, hill_shade = graph.result("raster")
+        else:
+            depth, = graph.result("raster")
+
+        # 添加自定义color map
+        cmap = custom_cmap()
+
+        # 绘制深度图及深度梯度计算所得山体阴影
+        cf = ax.imshow(
+            depth,
+            origin        = 'lower',
+            cmap          = cmap,
+            extent        = RASTER_EXTENT,
+            transform     = RASTER_CRS,
+            vmin          = -6000, 
+            vmax          = 200,
+            interpolation = 'nearest'
+            )
     
-    ax.imshow(
-        hill_shade,
-        origin        = 'lower',
-        cmap          = 'Greys_r',
-        extent        = LL_BBOX,
-        transform     = PROJ,
-        alpha         = 0.5,
-        interpolation = 'nearest'
-        )
-
-    # 设定colorbar
-    cbar = fig.colorbar(
-        cf, ax        = ax, 
-        extend        = 'both', 
-        shrink        = 0.5, 
-        pad           = 0.1, 
-        orientation   = 'horizontal', 
-        boundaries    = np.linspace(-6000, 200, 13))
+        if HILLSHADE:
+            ax.imshow(
+                hill_shade,
+                origin        = 'lower',
+                cmap          = 'Greys_r',
+                extent        = RASTER_EXTENT,
+                transform     = RASTER_CRS,
+                alpha         = 0.5,
+                interpolation = 'nearest'
+                )
+
+        if ISOBATH:
+            style = {k: v for k, v in isobath_param.items() if k not in ("levels", "tolerance")}
+            draw_isobaths(ax, graph.result("isobath"), **style)
+
+        # 设定colorbar
+        cbar = fig.colorbar(
+            cf, ax        = ax, 
+            extend        = 'both', 
+            shrink        = 0.5, 
+            pad           = 0.1, 
+            orientation   = 'horizontal', 
+            boundaries    = np.linspace(-6000, 200, 13))
     
-    cbar.ax.set_xlabel(
-        'Depth (m)', 
-        fontsize = GRID_FONTSIZE)
-    cbar.ax.tick_params(labelsize = GRID_FONTSIZE)
-    cbar.ax.yaxis.set_tick_params(labelsize = GRID_FONTSIZE)
-
-    gl = ax.gridlines(crs=ccrs.PlateCarree(),
-        draw_labels = True,
-        linestyle   = '--',
-        color       = 'grey',
-        linewidth   = 0.5,
-        alpha       = 0.5,
-        xlocs       = np.arange(lon_min,lon_max,5),
-        ylocs       = np.arange(lat_min,lat_max,5)
-        )
+        cbar.ax.set_xlabel(
+            'Depth (m)', 
+            fontsize = GRID_FONTSIZE)
+        cbar.ax.tick_params(labelsize = GRID_FONTSIZE)
+        cbar.ax.yaxis.set_tick_params(labelsize = GRID_FONTSIZE)
+
+        gl = ax.gridlines(crs=DATA_CRS,
+            draw_labels = True,
+            linestyle   = '--',
+            color       = 'grey',
+            linewidth   = 0.5,
+            alpha       = 0.5,
+            xlocs       = np.arange(lon_min,lon_max,5),
+            ylocs       = np.arange(lat_min,lat_max,5)
+            )
     
-    ax._autoscaleXon = False
-    ax._autoscaleYon = False
-    gl.xlabels_top   = False  
-    gl.ylabels_right = False  
-    gl.xlabel_style  = {'size': GRID_FONTSIZE, 'color': 'black'}
-    gl.ylabel_style  = {'size': GRID_FONTSIZE, 'color': 'black'}
-
-    # 绘制航次站点
-    files = glob(os.path.join(ROOT, "assets", "*.xlsx"))
-    for idx, file in enumerate(files):
-        section_name = file.split("\\")[-1].split(".")[0]
-        ds = pd.read_excel(file, sheet_name=0)
-
-        # 转为10分制
-        try:
-            ds['decimal_lon'] = ds['经度(度)'].dropna() + ds['经度(分)'].dropna() / 60
-            ds['decimal_lat'] = ds['纬度(度)'].dropna() + ds['纬度(分)'].dropna() / 60
-        except:
-            raise "excel文件经纬度数据列名错误"  
-        
-        # facecolor使用jet等额划分
-        facecolor = plt.cm.rainbow((len(files) - idx) / len(files))
-
-        ax.scatter(
-            ds['decimal_lon'],
-            ds['decimal_lat'],
-            color = facecolor,
-            alpha = SCATTER_ALPHA,
-            edgecolors = 'black',
-            s = SCATTER_SIZE,
-            label = section_name,
-            linewidth = SCATTER_LINEWIDTH,
-            transform = PROJ
-        )
-    legend = ax.legend(
-        loc = 'lower right', fontsize = LEGEND_FONTSIZE, ncol = 1,
-        )
-    legend.set_zorder(25)
-    plt.savefig(OUT, dpi = DPI, bbox_inches = 'tight')
+        ax._autoscaleXon = False
+        ax._autoscaleYon = False
+        gl.xlabels_top   = False  
+        gl.ylabels_right = False  
+        gl.xlabel_style  = {'size': GRID_FONTSIZE, 'color': 'black'}
+        gl.ylabel_style  = {'size': GRID_FONTSIZE, 'color': 'black'}
+
+        # 绘制概览图, 全球底图只在首次运行时渲染并缓存
+        if INSET:
+            add_inset_locator(ax, LL_BBOX, CACHE, **inset_param)
+
+        # 绘制航次站点
+        stations = graph.result("stations")
+        # 不同航次的同名断面分开绘制, 多航次时图例标注航次名
+        sections = list(stations.groupby(['cruise', 'section'], sort=False))
+        multi_cruise = stations['cruise'].nunique() > 1
+        for idx, ((cruise, section_name), ds) in enumerate(sections):
+            # facecolor使用jet等额划分
+            facecolor = plt.cm.rainbow((len(sections) - idx) / len(sections))
+
+            ax.scatter(
+                ds['decimal_lon'],
+                ds['decimal_lat'],
+                color = facecolor,
+                alpha = SCATTER_ALPHA,
+                edgecolors = 'black',
+                s = SCATTER_SIZE,
+                label = "%s %s" % (cruise, section_name) if multi_cruise else section_name,
+                linewidth = SCATTER_LINEWIDTH,
+                zorder = SCATTER_ZORDER,
+                transform = DATA_CRS
+            )
+
+        # 绘制各航次航线, 航程与航时写入图例, 多航次时以线型区分
+        if ROUTE:
+            style = {k: v for k, v in route_param.items() if k not in ("speed", "linestyle")}
+            linestyles = [route_param["linestyle"]] + [ls for ls in ('-', '--', ':', '-.') if ls != route_param["linestyle"]]
+            for idx, (cruise, lon, lat, order, dist, hours) in enumerate(graph.result("route")):
+                draw_route(
+                    ax, lon, lat, order,
+                    label     = "%sRoute %.0f km / %.1f h" % (
+                        "%s " % cruise if multi_cruise else "", route_length(order, dist), hours[-1]),
+                    linestyle = linestyles[idx % len(linestyles)],
+                    **style)
+
+        legend = ax.legend(
+            loc = 'lower right', fontsize = LEGEND_FONTSIZE, ncol = 1,
+            )
+        legend.set_zorder(25)
+        plt.savefig(OUT, dpi = DPI, bbox_inches = 'tight')
+        plt.close(fig)
+    finally:
+        executor.shutdown(cancel_futures=True)          # 出错时取消尚未开始的加载任务
+
+    # 草图完成后在独立会话的后台进程中绘制正式图, 输出写入草图旁的日志文件
+    if preview and refine:
+        with open(os.path.splitext(OUT)[0] + "_refine.log", "w") as log:
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__)],
+                stdin             = subprocess.DEVNULL,
+                stdout            = log,
+                stderr            = subprocess.STDOUT,
+                start_new_session = True,
+                creationflags     = subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0)
+    if cache_stats:
+        print(CACHE.stats())
+    return OUT
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="section plot of marine scientific research")
+    parser.add_argument("--preview", action="store_true", help="快速草图模式")
+    parser.add_argument("--refine", action="store_true", help="草图完成后在后台绘制正式图")
+    parser.add_argument("--cache-stats", action="store_true", help="输出缓存命中统计")
+    args = parser.parse_args()
+    main(preview=args.preview, refine=args.refine, cache_stats=args.cache_stats)
@@ -9,7 +9,59 @@
 @envName     :  nc_cartopy(laptop); geoDraw(pc)
 '''
 
-table_dir:str = r"assets/*.xlsx"
+table_dir:str = r"assets/**/*.xlsx"             # 站点表, assets/<航次>/<断面>.xlsx
+
+cruise_name:str = None                          # 航次名, None时取站点表所在目录名(assets下的表为"assets")
+
+catalogue_dir:str = r"stations.sqlite"          # 站点库, 按文件增量更新
+
+station_filter:dict = {                         # 站点筛选, None表示不筛选
+    "cruise"        : None,
+    "section"       : None,
+    "station_type"  : None,
+    "status"        : None
+}
+
+proj_param:dict = {
+    "name"      : "PlateCarree",                # PlateCarree / Mercator / LambertConformal
+    "tolerance" : 1e-4                          # 几何简化容差, 相对图幅宽度
+}
+
+feature_dir:dict = {                            # Natural Earth 要素
+    "coastline" : {
+        "category"  : 'physical',
+        "name"      : 'coastline',
+        "scale"     : '50m',
+        "facecolor" : 'none',
+        "edgecolor" : 'black',
+        "linewidth" : 0.5,
+        "linestyle" : '-',
+        "alpha"     : None,
+        "zorder"    : 20
+    },
+    "borders"   : {
+        "category"  : 'cultural',
+        "name"      : 'admin_0_boundary_lines_land',
+        "scale"     : '50m',
+        "facecolor" : 'none',
+        "edgecolor" : 'black',
+        "linewidth" : 0.8,
+        "linestyle" : '-',
+        "alpha"     : None,
+        "zorder"    : 20
+    },
+    "land"      : {
+        "category"  : 'physical',
+        "name"      : 'land',
+        "scale"     : '50m',
+        "facecolor" : 'grey',
+        "edgecolor" : 'face',
+        "linewidth" : 0,
+        "linestyle" : '-',
+        "alpha"     : 0.5,
+        "zorder"    : 10
+    }
+}
 
 shp_dir:dict = {
     "city"      : {
@@ -70,6 +122,47 @@ shp_dir:dict = {
         }
 }
 
+route_param:dict = {                            # 站点航线规划
+    "speed"     : 10,                           # 航速(节)
+    "color"     : 'black',
+    "linewidth" : 0.5,
+    "linestyle" : '-',
+    "zorder"    : 22
+}
+
+isobath_param:dict = {
+    "levels"    : [-3000, -1000, -200],         # 等深线(m)
+    "tolerance" : 2e-4,                         # 简化容差, 相对图幅宽度
+    "color"     : 'dimgrey',
+    "linewidth" : 0.3,
+    "fontsize"  : 4,
+    "labels"    : 2,                            # 每个深度标注的线条数
+    "zorder"    : 15
+}
+
+preview_param:dict = {                          # 草图模式
+    "dpi"       : 150,                          # 分辨率
+    "factor"    : 8,                            # 水深金字塔层级(降采样倍数)
+    "tolerance" : 2e-3,                         # 几何简化容差
+    "scale"     : '110m',                       # Natural Earth 分辨率
+    "out"       : "marineRsearch_preview.png"   # 输出文件名
+}
+
 gebcco_dir:dict = {
     "SCS":r"assets/bathymetry/GEBCO_2022_105_125_5_25.nc"
-}
\ No newline at end of file
+}
+
+cache_dir:str = r"cache"
+cache_max_mb:float = 2048                       # 缓存上限(MB), 超出后按最近最少使用淘汰
+cache_memory_mb:float = 256                     # 进程内缓存上限(MB), 批量绘图时跳过磁盘读取
+
+inset_param:dict = {
+    "bounds"      : (0.0, 0.78, 0.22, 0.22),    # [x0, y0, width, height], 相对主图
+    "pad"         : 4,                          # 概览范围相对LL_BBOX的倍数
+    "width"       : 720,                        # 全球底图像素宽度
+    "land_color"  : 'lightgrey',
+    "ocean_color" : 'white',
+    "coast_color" : 'black',
+    "edgecolor"   : 'red',
+    "zorder"      : 21                          # 低于航线与站点, 不遮挡站点
+}
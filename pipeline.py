@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  pipeline.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  dependency graph of data loading tasks on an executor
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import threading
+from concurrent.futures import Future
+
+
+class TaskGraph:
+    """
+    Description: run tasks on an executor as soon as their dependencies are done ::
+
+        :  depth             --> hillshade, isobath
+        :  depth, hillshade  --> raster
+        :  stations          --> route
+
+    a task is only submitted once all its dependencies have finished, so no
+    worker ever blocks waiting on another task; results are collected on the
+    calling (main) thread with result(); once the executor is shut down,
+    tasks not started yet are cancelled together with their dependants
+    Input:
+        executor: concurrent.futures executor
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.futures  = {}
+
+    def add(self, name:str, func, *deps) -> Future:
+        """
+        Description: add a task
+        Input:
+            name: task name
+            func: callable, called with the results of deps in order
+            deps: names of tasks added before
+        Output:
+            future: future of the task result
+        """
+        future = Future()
+        dep_futures = [self.futures[dep] for dep in deps]
+        lock = threading.Lock()
+        started = []
+
+        def finish(inner:Future):
+            if inner.cancelled():
+                future.cancel()
+            elif inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                future.set_result(inner.result())
+
+        def launch(_=None):
+            if not all(dep.done() for dep in dep_futures):
+                return
+            with lock:
+                if started:
+                    return
+                started.append(True)
+            for dep in dep_futures:
+                if dep.cancelled():
+                    future.cancel()
+                    return
+                if dep.exception() is not None:
+                    future.set_exception(dep.exception())
+                    return
+            try:
+                inner = self.executor.submit(func, *[dep.result() for dep in dep_futures])
+            except RuntimeError:                        # 线程池已关闭(主线程出错), 不再启动后续任务
+                future.cancel()
+                return
+            inner.add_done_callback(finish)
+
+        self.futures[name] = future
+        for dep in dep_futures:
+            dep.add_done_callback(launch)
+        launch()
+        return future
+
+    def result(self, name:str):
+        """
+        Description: wait for a task and return its result (re-raise its exception)
+        """
+        return self.futures[name].result()
@@ -0,0 +1,211 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  route.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  station route planning (distance matrix, visiting order, steaming time)
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import numpy as np
+import cartopy.crs as ccrs
+
+
+EARTH_RADIUS = 6371.0088                                # 地球平均半径(km)
+KNOT = 1.852                                            # 1节 = 1.852 km/h
+
+
+def haversine_matrix(lon:np.ndarray, lat:np.ndarray) -> np.ndarray:
+    """
+    Description: great circle distance between every pair of stations
+    Function:
+        $$d = 2R\\arcsin\\sqrt{\\sin^2(\\Delta\\varphi/2) + \\cos\\varphi_1\\cos\\varphi_2\\sin^2(\\Delta\\lambda/2)}$$
+    Input:
+        lon: station longitude (degree)
+        lat: station latitude (degree)
+    Output:
+        dist: (n, n) distance matrix (km)
+    """
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    dlon = lon[:, None] - lon[None, :]
+    dlat = lat[:, None] - lat[None, :]
+    a = np.sin(dlat/2)**2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon/2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def nearest_neighbour(dist:np.ndarray, start:int=0) -> np.ndarray:
+    """
+    Description: visiting order by always steaming to the closest unvisited station
+    Input:
+        dist: (n, n) distance matrix
+        start: index of the first station
+    Output:
+        order: station indices
+    """
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=np.int64)
+    order[0] = start
+    visited[start] = True
+    for k in range(1, n):
+        row = np.where(visited, np.inf, dist[order[k-1]])
+        order[k] = np.argmin(row)
+        visited[order[k]] = True
+    return order
+
+def _with_sentinel(dist:np.ndarray) -> np.ndarray:
+    """
+    Description: append a sentinel station at zero distance from all others,
+    placing it at both ends of the order turns the open route into a closed
+    one, so the end stations are free to change
+    """
+    n = len(dist)
+    ext = np.zeros((n+1, n+1), dtype=dist.dtype)
+    ext[:n, :n] = dist
+    return ext
+
+def two_opt(order:np.ndarray, dist:np.ndarray, eps:float=1e-9) -> np.ndarray:
+    """
+    Description: 2-opt improvement of an open route, reverse the segment
+    order[i..j] whenever it shortens the route ::
+
+        :  ... a[i-1] -> a[i] ... a[j] -> a[j+1] ...
+        :  ... a[i-1] -> a[j] ... a[i] -> a[j+1] ...
+
+    every candidate j of one i is evaluated at once
+    Input:
+        order: station indices
+        dist: (n, n) distance matrix
+        eps: minimum improvement (km)
+    Output:
+        order: improved station indices
+    """
+    n = len(order)
+    ext = _with_sentinel(dist)
+    path = np.concatenate([[n], order, [n]])
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n):
+            j = np.arange(i+1, n+1)
+            delta = (ext[path[i-1], path[j]] + ext[path[i], path[j+1]]
+                     - ext[path[i-1], path[i]] - ext[path[j], path[j+1]])
+            best = np.argmin(delta)
+            if delta[best] < -eps:
+                path[i:j[best]+1] = path[i:j[best]+1][::-1]
+                improved = True
+    return path[1:-1]
+
+def or_opt(order:np.ndarray, dist:np.ndarray, lengths:tuple=(1, 2, 3), eps:float=1e-9) -> np.ndarray:
+    """
+    Description: Or-opt improvement of an open route, move a segment of 1-3
+    stations (optionally reversed) to the best other position, every
+    insertion position of one segment is evaluated at once
+    Input:
+        order: station indices
+        dist: (n, n) distance matrix
+        lengths: segment lengths to try
+        eps: minimum improvement (km)
+    Output:
+        order: improved station indices
+    """
+    n = len(order)
+    ext = _with_sentinel(dist)
+    path = np.concatenate([[n], order, [n]])
+    improved = True
+    while improved:
+        improved = False
+        for length in lengths:
+            i = 1
+            while i + length - 1 <= n:
+                first, last = path[i], path[i+length-1]
+                removal = (ext[path[i-1], first] + ext[last, path[i+length]]
+                           - ext[path[i-1], path[i+length]])
+
+                rest = np.concatenate([path[:i], path[i+length:]])
+                head, tail = rest[:-1], rest[1:]
+                forward  = ext[head, first] + ext[last, tail] - ext[head, tail]
+                backward = ext[head, last] + ext[first, tail] - ext[head, tail]
+                insert = np.minimum(forward, backward)
+                k = np.argmin(insert)
+
+                if insert[k] - removal < -eps:
+                    segment = path[i:i+length]
+                    if backward[k] < forward[k]:
+                        segment = segment[::-1]
+                    path = np.concatenate([rest[:k+1], segment, rest[k+1:]])
+                    improved = True
+                i += 1
+    return path[1:-1]
+
+def plan_route(lon:np.ndarray, lat:np.ndarray, start:int=0) -> tuple:
+    """
+    Description: near-optimal visiting order of the stations,
+    nearest neighbour followed by 2-opt and Or-opt until neither improves
+    Input:
+        lon: station longitude (degree)
+        lat: station latitude (degree)
+        start: index of the station the nearest neighbour tour starts from
+    Output:
+        order: station indices
+        dist: (n, n) distance matrix (km)
+    """
+    dist = haversine_matrix(lon, lat)
+    if len(dist) < 3:
+        return np.arange(len(dist)), dist
+
+    order = nearest_neighbour(dist, start)
+    length = route_length(order, dist)
+    while True:
+        order = or_opt(two_opt(order, dist), dist)
+        new_length = route_length(order, dist)
+        if new_length >= length - 1e-9:
+            break
+        length = new_length
+    return order, dist
+
+def route_length(order:np.ndarray, dist:np.ndarray) -> float:
+    """
+    Description: total route length (km)
+    """
+    return float(dist[order[:-1], order[1:]].sum())
+
+def steaming_hours(order:np.ndarray, dist:np.ndarray, speed:float=10) -> np.ndarray:
+    """
+    Description: cumulative steaming hours at every station of the route
+    Input:
+        order: station indices
+        dist: (n, n) distance matrix (km)
+        speed: ship speed (knot)
+    Output:
+        hours: arrival hours, 0 at the first station
+    """
+    legs = dist[order[:-1], order[1:]] / (speed * KNOT)
+    return np.concatenate([[0], np.cumsum(legs)])
+
+def draw_route(ax, lon:np.ndarray, lat:np.ndarray, order:np.ndarray, label:str=None,
+               color='black', linewidth:float=0.5, linestyle='-', zorder:int=22):
+    """
+    Description: draw the route as great circle legs
+    Input:
+        ax: cartopy GeoAxes
+        lon, lat: station position (degree)
+        order: station indices
+        label: legend label
+        color, linewidth, linestyle, zorder: line style
+    Output:
+        line: matplotlib Line2D
+    """
+    line, = ax.plot(
+        np.asarray(lon)[order],
+        np.asarray(lat)[order],
+        color     = color,
+        linewidth = linewidth,
+        linestyle = linestyle,
+        zorder    = zorder,
+        label     = label,
+        transform = ccrs.Geodetic()
+    )
+    return line
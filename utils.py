@@ -141,13 +141,41 @@ def generate_rectangle(ll_bbox:list,edgecolor:str='k',zorder:int=1):
             )
     return rect
 
+def build_projection(name:str, ll_bbox:list):
+    """
+    Description: build a cartopy projection centered on the longitude latitude border box
+    Input:
+        name: PlateCarree / Mercator / LambertConformal
+        ll_bbox: [lon_min, lon_max, lat_min, lat_max]
+    Output:
+        proj: cartopy.crs.Projection object
+    """
+    import cartopy.crs as ccrs
+
+    lon_c, lat_c = cal_center(ll_bbox)
+    if name == "PlateCarree":
+        return ccrs.PlateCarree()
+    if name == "Mercator":
+        return ccrs.Mercator(central_longitude=lon_c)
+    if name == "LambertConformal":
+        # 标准纬线取纬度范围的1/6与5/6处
+        span = ll_bbox[3] - ll_bbox[2]
+        return ccrs.LambertConformal(
+            central_longitude   = lon_c,
+            central_latitude    = lat_c,
+            standard_parallels  = (ll_bbox[2] + span/6, ll_bbox[3] - span/6)
+        )
+    raise ValueError("未知投影方式: %s" % name)
 
-def load_depth_ds(ncdir:str, LL_BBOX:list) -> np.array:
+
+def load_depth_ds(ncdir:str, LL_BBOX:list, factor:int=1, cache=None) -> np.array:
     """
         Description : load depth netCDF format dataset and mask land
         Input       : 
             ncdir: netCDF gebcco depth dataset directory
             LL_BBOX: [lon_min, lon_max, lat_min, lat_max]
+            factor: pyramid level (downsample factor), 1 for full resolution
+            cache: cache.ArtifactCache for the land mask, None for no cache
         output      : np array
     """
     ds    = xr.open_dataset(ncdir)                               # 打开数据集
@@ -157,8 +185,14 @@ def load_depth_ds(ncdir:str, LL_BBOX:list) -> np.array:
     
     depth = depth.astype(np.float32)                             # 转换数据类型
     depth = logit_cut(lon, lat, depth, LL_BBOX)                  # 裁剪数据
+    depth = downsample(depth, factor)                            # 降采样至金字塔层级
 
-    mask         = generate_land_mask(LL_BBOX, depth.shape)      # 生成陆地掩膜
+    if cache is None:
+        mask = generate_land_mask(LL_BBOX, depth.shape)          # 生成陆地掩膜
+    else:                                                        # 掩膜只与范围和尺寸有关
+        mask = cache.array(
+            "land_mask", [LL_BBOX, depth.shape],
+            lambda: generate_land_mask(LL_BBOX, depth.shape))
     depth[mask]  = np.nan                                        # 掩膜数据
 
     return depth
@@ -190,4 +224,36 @@ def logit_cut(lon_array:np.ndarray, lat_array:np.ndarray, cut_array:np.ndarray,
     
     row_cut:np.ndarray = cut_array[lat_bool]
     col_cut:np.ndarray = row_cut[:, lon_bool]
-    return col_cut
\ No newline at end of file
+    return col_cut
+
+def downsample(array:np.ndarray, factor:int) -> np.ndarray:
+    """
+        Description: coarser pyramid level of a raster by nan-aware block mean,
+        trailing rows/columns that do not fill a whole block are dropped::
+
+            :   +---+---+
+            :   | a | b |       (a + b + c) / 3 if d is nan
+            :   +---+---+  -->
+            :   | c | d |
+            :   +---+---+
+
+        Input:
+            array: 1d or 2d array
+            factor: block size, 1 returns array unchanged
+        Output:
+            coarse: block mean array
+    """
+    if factor <= 1:
+        return array
+
+    shape = [n // factor for n in array.shape]
+    trim = array[tuple(slice(0, n * factor) for n in shape)]
+    blocks = trim.reshape([v for n in shape for v in (n, factor)])
+    axes = tuple(range(1, blocks.ndim, 2))
+
+    valid = np.isfinite(blocks)
+    total = np.where(valid, blocks, 0).sum(axis=axes)
+    count = valid.sum(axis=axes)
+    coarse = np.full(total.shape, np.nan, dtype=np.float32)
+    np.divide(total, count, out=coarse, where=count > 0)
+    return coarse
@@ -0,0 +1,97 @@
+# -*- encoding: utf-8 -*-
+'''
+@File        :  warp.py
+@Time        :  2024/8/27 23:16:00
+@Author      :  chen siyu
+@Mail        :  chensy57@mail2.sysu.edu.cn
+@Version     :  1.0
+@Description :  cached pixel index maps for reprojecting regular lon/lat rasters
+@envName     :  nc_cartopy(laptop); geoDraw(pc)
+'''
+
+import numpy as np
+import cartopy.crs as ccrs
+
+
+def compute_warp_index(src_shape:tuple, ll_bbox:list, proj, extent:list, out_shape:tuple,
+                       block:int=256) -> np.ndarray:
+    """
+    Description: source pixel index of every target pixel (nearest neighbour),
+    the source is a regular grid spanning ll_bbox with origin lower ::
+
+        :  target pixel center (x, y) --proj--> (lon, lat) --> (row, col)
+
+    Input:
+        src_shape: (lat_length, lon_length) of the source raster
+        ll_bbox: [lon_min, lon_max, lat_min, lat_max] of the source raster
+        proj: target cartopy projection
+        extent: [x_min, x_max, y_min, y_max] of the target raster in proj coordinate
+        out_shape: (rows, cols) of the target raster
+        block: target rows transformed at a time, bounds the peak memory
+    Output:
+        index: flat source index, -1 where the target pixel has no source
+    """
+    lon_min, lon_max, lat_min, lat_max = ll_bbox
+    x_min, x_max, y_min, y_max = extent
+    src_ny, src_nx = src_shape
+    out_ny, out_nx = out_shape
+    src_crs = ccrs.PlateCarree()
+
+    x = x_min + (np.arange(out_nx) + 0.5) * (x_max - x_min) / out_nx
+    y = y_min + (np.arange(out_ny) + 0.5) * (y_max - y_min) / out_ny
+
+    dtype = np.int32 if src_ny * src_nx < np.iinfo(np.int32).max else np.int64
+    index = np.empty(out_shape, dtype=dtype)
+
+    for start in range(0, out_ny, block):
+        stop = min(start + block, out_ny)
+        xx, yy = np.meshgrid(x, y[start:stop])
+        lonlat = src_crs.transform_points(proj, xx.ravel(), yy.ravel())
+        col = np.floor((lonlat[:, 0] - lon_min) / (lon_max - lon_min) * src_nx)
+        row = np.floor((lonlat[:, 1] - lat_min) / (lat_max - lat_min) * src_ny)
+
+        valid = np.isfinite(col) & np.isfinite(row)
+        valid &= (col >= 0) & (col < src_nx) & (row >= 0) & (row < src_ny)
+
+        out = np.full(col.shape, -1, dtype=dtype)
+        out[valid] = row[valid].astype(dtype) * src_nx + col[valid].astype(dtype)
+        index[start:stop] = out.reshape(stop - start, out_nx)
+    return index
+
+def warp_index(src_shape:tuple, ll_bbox:list, proj, extent:list, out_shape:tuple,
+               cache=None) -> np.ndarray:
+    """
+    Description: compute_warp_index cached by (grid, projection, extent, output shape)
+    in the artifact cache (and its in-process layer)
+    Input:
+        see compute_warp_index
+        cache: cache.ArtifactCache, None for no cache
+    Output:
+        index: flat source index, -1 where the target pixel has no source
+    """
+    compute = lambda: compute_warp_index(src_shape, ll_bbox, proj, extent, out_shape)
+    if cache is None:
+        return compute()
+
+    parts = [
+        tuple(src_shape),
+        ["%.6f" % v for v in ll_bbox],
+        proj.proj4_init,
+        ["%.6f" % v for v in extent],
+        tuple(out_shape)]
+    return cache.memo(cache.key("warp", *parts), lambda: cache.array("warp", parts, compute))
+
+def warp(index:np.ndarray, *arrays) -> list:
+    """
+    Description: warp rasters of the same grid with one gather
+    Input:
+        index: output of warp_index
+        arrays: source rasters, all of shape src_shape
+    Output:
+        warped: list of float32 rasters of shape index.shape, nan where no source
+    """
+    stack = np.stack([np.asarray(a, dtype=np.float32).ravel() for a in arrays])
+    valid = index >= 0
+    warped = stack[:, np.where(valid, index, 0)]
+    warped[:, ~valid] = np.nan
+    return list(warped)